@@ -0,0 +1,49 @@
+"""Notification tones and time formatting shared by the timer app"""
+import streamlit as st
+
+__all__ = [
+    "AVAILABLE_FREQUENCIES", "FREQUENCY_NAMES", "FREQ_INDEX",
+    "play_notification_sound", "format_time"
+]
+
+# Available frequencies for different timers
+AVAILABLE_FREQUENCIES = [440, 523, 659, 783, 880, 1047, 1175, 1319]  # A4, C5, E5, G5, A5, C6, D6, E6
+FREQUENCY_NAMES = ["A4", "C5", "E5", "G5", "A5", "C6", "D6", "E6"]
+FREQ_INDEX = {f: i for i, f in enumerate(AVAILABLE_FREQUENCIES)}
+
+# Length of the notification beep
+BEEP_SECONDS = 1.0
+
+# Synthesizes the beep in the browser with Web Audio; only the frequency is sent
+NOTIFICATION_HTML = """
+<script>
+const ctx = new (window.AudioContext || window.webkitAudioContext)();
+const osc = ctx.createOscillator();
+const gain = ctx.createGain();
+osc.frequency.value = {frequency};
+osc.connect(gain).connect(ctx.destination);
+// A context created without a user gesture can start suspended
+ctx.resume().then(() => {{
+    const end = ctx.currentTime + {beep_seconds};
+    // 10ms fade in/out to avoid clicks
+    gain.gain.setValueAtTime(0, ctx.currentTime);
+    gain.gain.linearRampToValueAtTime(1, ctx.currentTime + 0.01);
+    gain.gain.setValueAtTime(1, end - 0.01);
+    gain.gain.linearRampToValueAtTime(0, end);
+    osc.start();
+    osc.stop(end);
+}});
+</script>
+"""
+
+def format_time(seconds):
+    """Format seconds into MM:SS format"""
+    if seconds <= 0:
+        return "00:00"
+    
+    mins, secs = divmod(int(seconds), 60)
+    return f"{mins:02d}:{secs:02d}"
+
+def play_notification_sound(frequency):
+    """Play a notification sound using Web Audio"""
+    st.iframe(NOTIFICATION_HTML.format(frequency=frequency, beep_seconds=BEEP_SECONDS))
@@ -1,7 +1,11 @@
 import streamlit as st
+import math
 import time
-from datetime import datetime, timedelta
-import base64
+import numpy as np
+from audio import (
+    AVAILABLE_FREQUENCIES, FREQUENCY_NAMES, FREQ_INDEX,
+    format_time, play_notification_sound
+)
 
 # Configure page
 st.set_page_config(
@@ -10,6 +14,12 @@ st.set_page_config(
     layout="wide"
 )
 
+# Number of timer slots (configs and state arrays are sized to this)
+MAX_TIMERS = 6
+
+# Longest gap between deadline checks, so a tick that fires early is retried soon
+MAX_WATCH_SECONDS = 30
+
 # Initialize session state
 if 'num_timers' not in st.session_state:
     st.session_state.num_timers = 4
@@ -23,125 +33,187 @@ if 'timer_configs' not in st.session_state:
         {"name": "Custom Timer 5", "minutes": 60, "frequency": 880},
         {"name": "Custom Timer 6", "minutes": 90, "frequency": 1047}
     ]
-if 'timer_states' not in st.session_state:
-    st.session_state.timer_states = {}
-if 'finished_timers' not in st.session_state:
-    st.session_state.finished_timers = set()
-
-# Available frequencies for different timers
-AVAILABLE_FREQUENCIES = [440, 523, 659, 783, 880, 1047, 1175, 1319]  # A4, C5, E5, G5, A5, C6, D6, E6
-FREQUENCY_NAMES = ["A4", "C5", "E5", "G5", "A5", "C6", "D6", "E6"]
-
-def generate_beep_sound(frequency=440, duration=0.5, sample_rate=44100):
-    """Generate a simple beep sound as base64 encoded audio"""
-    try:
-        import numpy as np
+    for config in st.session_state.timer_configs:
+        config["duration_s"] = config["minutes"] * 60
+if 'timer_soa' not in st.session_state:
+    # Per-timer state as parallel arrays, indexed by timer number
+    st.session_state.timer_soa = {
+        'start': np.full(MAX_TIMERS, np.nan),
+        'duration_seconds': np.array([c["duration_s"] for c in st.session_state.timer_configs], dtype=np.float64),
+        'running': np.zeros(MAX_TIMERS, dtype=bool),
+        'finished': np.zeros(MAX_TIMERS, dtype=bool)
+    }
+if 'newly_finished' not in st.session_state:
+    st.session_state.newly_finished = []
+
+def get_time_remaining():
+    """Calculate remaining time for every timer as an array"""
+    soa = st.session_state.timer_soa
+    elapsed = time.monotonic() - soa['start']
+    remaining = np.where(soa['running'],
+                         np.maximum(0, soa['duration_seconds'] - elapsed),
+                         soa['duration_seconds'])
+    # Finished timers stay at zero until they are reset
+    return np.where(soa['finished'], 0, remaining)
+
+def start_timer(timer_idx):
+    """Start a specific timer"""
+    st.session_state.timer_soa['duration_seconds'][timer_idx] = st.session_state.timer_configs[timer_idx]["duration_s"]
+    st.session_state.timer_soa['start'][timer_idx] = time.monotonic()
+    st.session_state.timer_soa['running'][timer_idx] = True
+    st.session_state.timer_soa['finished'][timer_idx] = False
+
+def stop_timer(timer_idx):
+    """Stop a specific timer"""
+    st.session_state.timer_soa['running'][timer_idx] = False
+
+def reset_timer(timer_idx):
+    """Reset a specific timer"""
+    st.session_state.timer_soa['duration_seconds'][timer_idx] = st.session_state.timer_configs[timer_idx]["duration_s"]
+    st.session_state.timer_soa['start'][timer_idx] = np.nan
+    st.session_state.timer_soa['running'][timer_idx] = False
+    st.session_state.timer_soa['finished'][timer_idx] = False
+
+def collect_finished_timers():
+    """Stop running timers that reached zero and queue their notifications"""
+    soa = st.session_state.timer_soa
+    newly = (get_time_remaining() <= 0) & soa['running'] & ~soa['finished']
+    newly[st.session_state.num_timers:] = False
+    soa['finished'] |= newly
+    soa['running'] &= ~newly
+    for i in np.flatnonzero(newly):
+        config = st.session_state.timer_configs[i]
+        st.session_state.newly_finished.append((int(i), config["frequency"], config["name"]))
+    return bool(newly.any())
+
+def next_deadline():
+    """Seconds until the next shown running timer reaches zero, or None if none are running"""
+    n = st.session_state.num_timers
+    running = st.session_state.timer_soa['running'][:n]
+    if not running.any():
+        return None
+    return float(get_time_remaining()[:n][running].min())
+
+def watch_interval(next_due):
+    """Deadline watcher tick: the time to the next deadline, capped at MAX_WATCH_SECONDS"""
+    return min(max(1, math.ceil(next_due)), MAX_WATCH_SECONDS)
+
+def watch_deadlines():
+    """Rerun the app once the next running timer reaches zero"""
+    if collect_finished_timers():
+        st.rerun()
+    
+    # run_every is fixed at the last full run; rerun to shorten it as the deadline nears
+    next_due = next_deadline()
+    if next_due is not None and watch_interval(next_due) < st.session_state.watch_interval:
+        st.rerun()
+
+# Countdown and progress bar ticked by the browser; the server only sends the starting point
+COUNTDOWN_HTML = """
+<div style="font-family: 'Source Sans Pro', sans-serif;">
+    <h1 id="time" style="text-align: center; color: {color}; font-family: monospace; margin: 0;">{time_display}</h1>
+    <p style="text-align: center; color: {color}; font-weight: bold;">{status}</p>
+    <div style="background: #e6e6e6; border-radius: 4px; height: 8px;">
+        <div id="bar" style="background: {color}; border-radius: 4px; height: 8px; width: {percent}%;"></div>
+    </div>
+</div>
+<script>
+const total = {total}, running = {running};
+const deadline = performance.now() + {remaining} * 1000;
+const timeEl = document.getElementById("time"), barEl = document.getElementById("bar");
+const pad = (n) => String(n).padStart(2, "0");
+let lastSec = -1, lastBucket = -1;
+function tick() {{
+    const left = Math.max(0, (deadline - performance.now()) / 1000);
+    const sec = Math.floor(left);
+    // Only touch the DOM text when the displayed second changes
+    if (sec !== lastSec) {{
+        timeEl.textContent = pad(Math.floor(sec / 60)) + ":" + pad(sec % 60);
+        lastSec = sec;
+    }}
+    // Progress moves in 0.5% steps so the bar is restyled at most 200 times
+    const bucket = Math.floor(200 * (1 - left / total));
+    if (bucket !== lastBucket) {{
+        barEl.style.width = (bucket / 2) + "%";
+        lastBucket = bucket;
+    }}
+    if (left > 0) requestAnimationFrame(tick);
+}}
+if (running) requestAnimationFrame(tick);
+</script>
+"""
+
+def render_timer(timer_idx):
+    """Render a single timer panel; runs as a fragment so its buttons only redraw this panel"""
+    timer_id = f"timer_{timer_idx}"
+    config = st.session_state.timer_configs[timer_idx]
+    # The running countdown keeps the duration it started with until stopped or reset
+    total_seconds = st.session_state.timer_soa['duration_seconds'][timer_idx]
+    
+    # Calculate remaining time
+    remaining_seconds = get_time_remaining()[timer_idx]
+    is_running = bool(st.session_state.timer_soa['running'][timer_idx])
+    
+    # Determine status and color
+    if remaining_seconds <= 0 and st.session_state.timer_soa['finished'][timer_idx]:
+        status = "🔔 FINISHED!"
+        color = "red"
+    elif is_running:
+        status = "🏃 Running"
+        color = "green"
+    else:
+        status = "⏸️ Ready"
+        color = "blue"
+    
+    # Timer container
+    with st.container():
+        st.markdown(f"### {config['name']}")
         
-        # Generate sine wave
-        t = np.linspace(0, duration, int(sample_rate * duration), False)
-        wave = np.sin(2 * np.pi * frequency * t)
+        # Show exact duration
+        mins, secs = divmod(int(total_seconds), 60)
+        st.markdown(f"**Duration:** {mins} min {secs} sec")
         
-        # Apply fade in/out to avoid clicks
-        fade_samples = int(0.01 * sample_rate)  # 10ms fade
-        wave[:fade_samples] *= np.linspace(0, 1, fade_samples)
-        wave[-fade_samples:] *= np.linspace(1, 0, fade_samples)
+        # Large time display, status and progress bar
+        if is_running or st.session_state.timer_soa['finished'][timer_idx]:
+            progress = max(0, 1 - (remaining_seconds / total_seconds))
+        else:
+            progress = 0
+        st.iframe(COUNTDOWN_HTML.format(
+            color=color,
+            status=status,
+            time_display=format_time(remaining_seconds),
+            percent=int(progress * 200) / 2,
+            total=total_seconds,
+            remaining=remaining_seconds,
+            running="true" if is_running else "false"
+        ))
         
-        # Convert to 16-bit PCM
-        audio = (wave * 32767).astype(np.int16)
+        # Individual controls
+        control_cols = st.columns(4)
         
-        # Create WAV file in memory
-        import io
-        import struct
+        with control_cols[0]:
+            if st.button("▶️", key=f"start_{timer_id}", help="Start", disabled=is_running):
+                start_timer(timer_idx)
+                st.rerun()
         
-        buffer = io.BytesIO()
+        with control_cols[1]:
+            if st.button("⏹️", key=f"stop_{timer_id}", help="Stop", disabled=not is_running):
+                stop_timer(timer_idx)
+                st.rerun()
         
-        # WAV header
-        buffer.write(b'RIFF')
-        buffer.write(struct.pack('<I', 36 + len(audio) * 2))
-        buffer.write(b'WAVE')
-        buffer.write(b'fmt ')
-        buffer.write(struct.pack('<I', 16))
-        buffer.write(struct.pack('<H', 1))  # PCM
-        buffer.write(struct.pack('<H', 1))  # mono
-        buffer.write(struct.pack('<I', sample_rate))
-        buffer.write(struct.pack('<I', sample_rate * 2))
-        buffer.write(struct.pack('<H', 2))
-        buffer.write(struct.pack('<H', 16))
-        buffer.write(b'data')
-        buffer.write(struct.pack('<I', len(audio) * 2))
-        buffer.write(audio.tobytes())
+        with control_cols[2]:
+            if st.button("🔄", key=f"reset_{timer_id}", help="Reset"):
+                reset_timer(timer_idx)
+                st.rerun()
         
-        # Encode to base64
-        audio_b64 = base64.b64encode(buffer.getvalue()).decode()
-        return f"data:audio/wav;base64,{audio_b64}"
-    except ImportError:
-        st.error("NumPy is required for audio generation. Install with: pip install numpy")
-        return None
-
-def format_time(seconds):
-    """Format seconds into MM:SS format"""
-    if seconds <= 0:
-        return "00:00"
-    
-    mins = int(seconds // 60)
-    secs = int(seconds % 60)
-    return f"{mins:02d}:{secs:02d}"
-
-def get_time_remaining(timer_id):
-    """Calculate remaining time for a specific timer"""
-    if timer_id not in st.session_state.timer_states:
-        return None
-    
-    timer_state = st.session_state.timer_states[timer_id]
-    if timer_state['start_time'] is None or not timer_state['is_running']:
-        return timer_state['duration'] * 60
-    
-    elapsed = (datetime.now() - timer_state['start_time']).total_seconds()
-    remaining = (timer_state['duration'] * 60) - elapsed
-    return max(0, remaining)
-
-def play_notification_sound(frequency):
-    """Play a notification sound using HTML audio"""
-    try:
-        audio_data = generate_beep_sound(frequency, 1.0)  # 1 second beep
-        if audio_data:
-            audio_html = f"""
-            <audio autoplay>
-                <source src="{audio_data}" type="audio/wav">
-            </audio>
-            """
-            st.markdown(audio_html, unsafe_allow_html=True)
-    except Exception as e:
-        # Fallback: show a visual notification if audio fails
-        st.warning(f"🔔 Timer finished! (Audio unavailable: {str(e)})")
-
-def initialize_timer_state(timer_id, duration):
-    """Initialize state for a timer if it doesn't exist"""
-    if timer_id not in st.session_state.timer_states:
-        st.session_state.timer_states[timer_id] = {
-            'start_time': None,
-            'is_running': False,
-            'duration': duration
-        }
-
-def start_timer(timer_id):
-    """Start a specific timer"""
-    if timer_id in st.session_state.timer_states:
-        st.session_state.timer_states[timer_id]['start_time'] = datetime.now()
-        st.session_state.timer_states[timer_id]['is_running'] = True
-
-def stop_timer(timer_id):
-    """Stop a specific timer"""
-    if timer_id in st.session_state.timer_states:
-        st.session_state.timer_states[timer_id]['is_running'] = False
+        with control_cols[3]:
+            if st.button("🔊", key=f"test_{timer_id}", help="Test Sound"):
+                play_notification_sound(config["frequency"])
+        
+        st.markdown("---")
 
-def reset_timer(timer_id):
-    """Reset a specific timer"""
-    if timer_id in st.session_state.timer_states:
-        st.session_state.timer_states[timer_id]['start_time'] = None
-        st.session_state.timer_states[timer_id]['is_running'] = False
-        if timer_id in st.session_state.finished_timers:
-            st.session_state.finished_timers.remove(timer_id)
+# Catch timers that ran out since the last run
+collect_finished_timers()
 
 # Title and description
 st.title("⏰ Enhanced Exam Timer")
@@ -152,55 +224,66 @@ st.markdown("---")
 st.subheader("🛠️ Timer Configuration")
 
 # Number of timers selector
-new_num_timers = st.slider("Number of Timers", min_value=1, max_value=6, value=st.session_state.num_timers)
+new_num_timers = st.slider("Number of Timers", min_value=1, max_value=MAX_TIMERS, value=st.session_state.num_timers)
 
 if new_num_timers != st.session_state.num_timers:
     st.session_state.num_timers = new_num_timers
     st.rerun()
 
-# Timer configuration
-config_cols = st.columns(min(3, st.session_state.num_timers))
-for i in range(st.session_state.num_timers):
-    col_idx = i % len(config_cols)
-    with config_cols[col_idx]:
-        st.markdown(f"**Timer {i+1}**")
-        
-        # Timer name
-        new_name = st.text_input(
-            f"Name", 
-            value=st.session_state.timer_configs[i]["name"], 
-            key=f"name_{i}"
-        )
-        if new_name != st.session_state.timer_configs[i]["name"]:
-            st.session_state.timer_configs[i]["name"] = new_name
+# Timer configuration (batched in a form so edits only apply on submit)
+with st.form("timer_config", clear_on_submit=False):
+    config_cols = st.columns(min(3, st.session_state.num_timers))
+    new_configs = []
+    for i in range(st.session_state.num_timers):
+        col_idx = i % len(config_cols)
+        with config_cols[col_idx]:
+            st.markdown(f"**Timer {i+1}**")
+            
+            # Timer name
+            new_name = st.text_input(
+                f"Name", 
+                value=st.session_state.timer_configs[i]["name"], 
+                key=f"name_{i}"
+            )
+            
+            # Timer duration
+            new_minutes = st.number_input(
+                f"Minutes", 
+                min_value=0.25, 
+                max_value=300.0, 
+                value=float(st.session_state.timer_configs[i]["minutes"]), 
+                step=0.25,
+                key=f"minutes_{i}"
+            )
+            
+            # Sound frequency
+            freq_idx = FREQ_INDEX.get(st.session_state.timer_configs[i]["frequency"], 0)
+            new_freq_idx = st.selectbox(
+                f"Sound", 
+                range(len(AVAILABLE_FREQUENCIES)),
+                index=freq_idx,
+                format_func=lambda x: f"{FREQUENCY_NAMES[x]} ({AVAILABLE_FREQUENCIES[x]}Hz)",
+                key=f"freq_{i}"
+            )
+            new_configs.append((new_name, new_minutes, AVAILABLE_FREQUENCIES[new_freq_idx]))
+    
+    submitted = st.form_submit_button("Apply")
+
+if submitted:
+    for i, (new_name, new_minutes, new_frequency) in enumerate(new_configs):
+        config = st.session_state.timer_configs[i]
+        if new_name != config["name"]:
+            config["name"] = new_name
         
-        # Timer duration
-        new_minutes = st.number_input(
-            f"Minutes", 
-            min_value=0.25, 
-            max_value=300.0, 
-            value=float(st.session_state.timer_configs[i]["minutes"]), 
-            step=0.25,
-            key=f"minutes_{i}"
-        )
-        if new_minutes != st.session_state.timer_configs[i]["minutes"]:
-            st.session_state.timer_configs[i]["minutes"] = new_minutes
+        if new_minutes != config["minutes"]:
+            config["minutes"] = new_minutes
+            config["duration_s"] = new_minutes * 60
             # Update timer state if not running
-            timer_id = f"timer_{i}"
-            if timer_id in st.session_state.timer_states and not st.session_state.timer_states[timer_id]['is_running']:
-                st.session_state.timer_states[timer_id]['duration'] = new_minutes
+            if not st.session_state.timer_soa['running'][i]:
+                st.session_state.timer_soa['duration_seconds'][i] = config["duration_s"]
         
-        # Sound frequency
-        freq_idx = AVAILABLE_FREQUENCIES.index(st.session_state.timer_configs[i]["frequency"]) if st.session_state.timer_configs[i]["frequency"] in AVAILABLE_FREQUENCIES else 0
-        new_freq_idx = st.selectbox(
-            f"Sound", 
-            range(len(AVAILABLE_FREQUENCIES)),
-            index=freq_idx,
-            format_func=lambda x: f"{FREQUENCY_NAMES[x]} ({AVAILABLE_FREQUENCIES[x]}Hz)",
-            key=f"freq_{i}"
-        )
-        if AVAILABLE_FREQUENCIES[new_freq_idx] != st.session_state.timer_configs[i]["frequency"]:
-            st.session_state.timer_configs[i]["frequency"] = AVAILABLE_FREQUENCIES[new_freq_idx]
+        if new_frequency != config["frequency"]:
+            config["frequency"] = new_frequency
 
 # Global controls
 st.subheader("🎮 Global Controls")
@@ -209,30 +292,24 @@ global_cols = st.columns(4)
 with global_cols[0]:
     if st.button("🚀 Start All Timers"):
         for i in range(st.session_state.num_timers):
-            timer_id = f"timer_{i}"
-            initialize_timer_state(timer_id, st.session_state.timer_configs[i]["minutes"])
-            start_timer(timer_id)
+            start_timer(i)
         st.rerun()
 
 with global_cols[1]:
     if st.button("⏹️ Stop All Timers"):
         for i in range(st.session_state.num_timers):
-            timer_id = f"timer_{i}"
-            stop_timer(timer_id)
+            stop_timer(i)
         st.rerun()
 
 with global_cols[2]:
     if st.button("🔄 Reset All Timers"):
         for i in range(st.session_state.num_timers):
-            timer_id = f"timer_{i}"
-            reset_timer(timer_id)
+            reset_timer(i)
         st.rerun()
 
 with global_cols[3]:
     # Status indicator
-    running_count = sum(1 for i in range(st.session_state.num_timers) 
-                       if f"timer_{i}" in st.session_state.timer_states 
-                       and st.session_state.timer_states[f"timer_{i}"]["is_running"])
+    running_count = int(st.session_state.timer_soa['running'][:st.session_state.num_timers].sum())
     
     if running_count > 0:
         st.success(f"✅ {running_count} timer(s) running")
@@ -248,8 +325,6 @@ st.subheader("⏱️ Timer Display")
 cols_per_row = 3 if st.session_state.num_timers > 4 else 2
 rows_needed = (st.session_state.num_timers + cols_per_row - 1) // cols_per_row
 
-newly_finished = []
-
 for row in range(rows_needed):
     timer_cols = st.columns(cols_per_row)
     
@@ -259,107 +334,27 @@ for row in range(rows_needed):
             break
             
         with timer_cols[col]:
-            timer_id = f"timer_{timer_idx}"
-            config = st.session_state.timer_configs[timer_idx]
-            
-            # Initialize timer state if needed
-            initialize_timer_state(timer_id, config["minutes"])
-            
-            # Calculate remaining time
-            remaining_seconds = get_time_remaining(timer_id)
-            
-            # Check if timer just finished
-            just_finished = (remaining_seconds is not None and 
-                           remaining_seconds <= 0 and 
-                           st.session_state.timer_states[timer_id]["is_running"] and 
-                           timer_id not in st.session_state.finished_timers)
-            
-            if just_finished:
-                newly_finished.append((timer_id, config["frequency"], config["name"]))
-                st.session_state.finished_timers.add(timer_id)
-                st.session_state.timer_states[timer_id]["is_running"] = False
-            
-            # Determine status and color
-            is_running = st.session_state.timer_states[timer_id]["is_running"]
-            if remaining_seconds <= 0 and timer_id in st.session_state.finished_timers:
-                status = "🔔 FINISHED!"
-                color = "red"
-            elif is_running:
-                status = "🏃 Running"
-                color = "green"
-            else:
-                status = "⏸️ Ready"
-                color = "blue"
-            
-            # Timer container
-            with st.container():
-                st.markdown(f"### {config['name']}")
-                
-                # Show exact duration
-                total_seconds = int(config["minutes"] * 60)
-                mins = total_seconds // 60
-                secs = total_seconds % 60
-                st.markdown(f"**Duration:** {mins} min {secs} sec")
-                
-                # Large time display
-                time_display = format_time(remaining_seconds) if remaining_seconds is not None else "00:00"
-                st.markdown(f"<h1 style='text-align: center; color: {color}; font-family: monospace;'>{time_display}</h1>", 
-                           unsafe_allow_html=True)
-                
-                st.markdown(f"<p style='text-align: center; color: {color}; font-weight: bold;'>{status}</p>", 
-                           unsafe_allow_html=True)
-                
-                # Progress bar
-                if remaining_seconds is not None:
-                    if is_running or timer_id in st.session_state.finished_timers:
-                        progress = max(0, 1 - (remaining_seconds / (config["minutes"] * 60)))
-                        st.progress(progress)
-                    else:
-                        st.progress(0)
-                
-                # Individual controls
-                control_cols = st.columns(4)
-                
-                with control_cols[0]:
-                    if st.button("▶️", key=f"start_{timer_id}", help="Start", disabled=is_running):
-                        start_timer(timer_id)
-                        st.rerun()
-                
-                with control_cols[1]:
-                    if st.button("⏹️", key=f"stop_{timer_id}", help="Stop", disabled=not is_running):
-                        stop_timer(timer_id)
-                        st.rerun()
-                
-                with control_cols[2]:
-                    if st.button("🔄", key=f"reset_{timer_id}", help="Reset"):
-                        reset_timer(timer_id)
-                        st.rerun()
-                
-                with control_cols[3]:
-                    if st.button("🔊", key=f"test_{timer_id}", help="Test Sound"):
-                        play_notification_sound(config["frequency"])
-                
-                st.markdown("---")
+            st.fragment(render_timer)(timer_idx)
+
+# Wake the server when the next running timer is due (checking at least every
+# MAX_WATCH_SECONDS), not every second
+next_due = next_deadline()
+if next_due is not None:
+    st.session_state.watch_interval = watch_interval(next_due)
+    st.fragment(watch_deadlines, run_every=st.session_state.watch_interval)()
 
 # Play sounds for newly finished timers
-for timer_id, frequency, name in newly_finished:
+for timer_idx, frequency, name in st.session_state.newly_finished:
     play_notification_sound(frequency)
     st.success(f"🎵 {name} finished!")
-
-# Auto-refresh when any timer is running
-any_running = any(st.session_state.timer_states.get(f"timer_{i}", {}).get("is_running", False) 
-                  for i in range(st.session_state.num_timers))
-
-if any_running:
-    time.sleep(1)
-    st.rerun()
+st.session_state.newly_finished = []
 
 # Instructions
 st.markdown("---")
 st.subheader("📋 Instructions")
 st.markdown("**Configuration:**")
 st.markdown("- Adjust the number of timers using the slider")
-st.markdown("- Set custom names, durations, and sounds for each timer")
+st.markdown("- Set custom names, durations, and sounds for each timer, then press **Apply**")
 st.markdown("- Each timer can have a different musical note")
 
 st.markdown("**Global Controls:**")